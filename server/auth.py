@@ -39,10 +39,14 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security)
-) -> UserInDB:
-    """Get the current authenticated user"""
+async def get_user_from_token(token: str, scope: Optional[str] = None) -> UserInDB:
+    """
+    Resolve a JWT to its user.
+
+    scope must match the token's own: regular access tokens have none, and
+    scoped tokens (e.g. short-lived event stream tokens) are only accepted
+    where that scope is asked for.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -50,10 +54,9 @@ async def get_current_user(
     )
     
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
         user_id: str = payload.get("id")
-        if user_id is None:
+        if user_id is None or payload.get("scope") != scope:
             raise credentials_exception
         token_data = TokenData(user_id=user_id)
     except JWTError:
@@ -65,3 +68,10 @@ async def get_current_user(
         raise credentials_exception
     
     return UserInDB(**user)
+
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> UserInDB:
+    """Get the current authenticated user"""
+    return await get_user_from_token(credentials.credentials)
@@ -14,6 +14,18 @@ class Settings(BaseSettings):
     # Server
     port: int = 8000
     environment: str = "development"
+    startup_retry_seconds: int = 5
+    
+    # Idempotency
+    idempotency_ttl_seconds: int = 86400  # 24 hours
+    idempotency_cache_size: int = 1000
+    idempotency_lock_seconds: int = 60  # lease on in-progress requests
+    
+    # Change feed
+    event_source: str = "local"  # "local" or "mongo" (change stream, for multiple workers)
+    event_queue_size: int = 100
+    event_heartbeat_seconds: int = 15
+    event_token_expire_seconds: int = 60  # ?token= for /api/events only accepts these
     
     # CORS
     cors_origins: str = "http://localhost:5173"
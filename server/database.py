@@ -6,12 +6,15 @@ database = None
 
 
 async def connect_to_mongo():
-    """Connect to MongoDB"""
+    """Create the MongoDB client; connections are opened lazily on first use"""
     global client, database
+    client = AsyncIOMotorClient(settings.mongodb_uri)
+    database = client.myassistant
+
+
+async def ping_mongo():
+    """Check that MongoDB is reachable"""
     try:
-        client = AsyncIOMotorClient(settings.mongodb_uri)
-        database = client.myassistant
-        # Test connection
         await client.admin.command('ping')
         print("✅ MongoDB Connected successfully")
     except Exception as e:
@@ -0,0 +1,263 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from config import settings
+from database import get_database
+
+IDEMPOTENCY_HEADER = b"idempotency-key"
+REPLAYED_HEADER = b"idempotent-replayed"
+MAX_KEY_LENGTH = 255
+
+# Login/register responses carry access tokens, which must not be stored
+EXCLUDED_PREFIXES = ("/api/auth/",)
+
+# Headers worth replaying; the rest are regenerated per response
+REPLAY_HEADERS = {b"content-type", b"location"}
+
+
+class ResponseCache:
+    """Small in-memory LRU of completed responses in front of the Mongo collection"""
+
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, record = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return record
+
+    def set(self, key: str, record: dict, expires_at: Optional[datetime] = None):
+        """Cache record until expires_at (the stored record's own expiry), at most the TTL"""
+        ttl_seconds = self.ttl_seconds
+        if expires_at is not None:
+            ttl_seconds = min(ttl_seconds, (expires_at - datetime.utcnow()).total_seconds())
+        if ttl_seconds <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl_seconds, record)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+response_cache = ResponseCache(settings.idempotency_cache_size, settings.idempotency_ttl_seconds)
+# Requests currently executing in this process, keyed like the cache
+in_flight: Dict[str, asyncio.Future] = {}
+
+
+async def ensure_idempotency_indexes():
+    """
+    Expire records at their own expires_at.
+
+    In-progress records get a short lease and completed responses the full
+    TTL, so changing either setting never needs the index rebuilt.
+    """
+    db = get_database()
+    await db.idempotency_keys.create_index("expires_at", expireAfterSeconds=0)
+
+
+def _now() -> datetime:
+    """Current time at Mongo's millisecond precision, so it can be matched on exactly"""
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def _stored_record(document: dict) -> dict:
+    return {
+        "fingerprint": document["fingerprint"],
+        "status": document["status_code"],
+        "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in document["headers"]],
+        "body": bytes(document["body"]),
+    }
+
+
+def _json_error(status_code: int, detail: str) -> dict:
+    return {
+        "status": status_code,
+        "headers": [(b"content-type", b"application/json")],
+        "body": json.dumps({"detail": detail}).encode("utf-8"),
+    }
+
+
+class IdempotencyMiddleware:
+    """
+    Replay the stored response for POST requests that repeat an Idempotency-Key.
+
+    Keys are scoped to the caller's Authorization header and the request path;
+    unauthenticated requests and the auth endpoints are passed through untouched
+    so no caller shares a key space and no token is stored. A retry with the
+    same key and body gets the original 2xx response back without re-running
+    the endpoint; the same key with a different body is rejected.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        idempotency_key = headers.get(IDEMPOTENCY_HEADER)
+        authorization = headers.get(b"authorization")
+        if not idempotency_key or not authorization or scope["path"].startswith(EXCLUDED_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            await self._send(send, _json_error(400, "Idempotency-Key is too long"))
+            return
+
+        body = await self._read_body(receive)
+        cache_key = hashlib.sha256(
+            b"\n".join([authorization, scope["path"].encode("utf-8"), idempotency_key])
+        ).hexdigest()
+        fingerprint = hashlib.sha256(body).hexdigest()
+
+        record = response_cache.get(cache_key)
+        while record is None and cache_key in in_flight:
+            # Wait for the first request instead of executing again
+            record = await asyncio.shield(in_flight[cache_key])
+        replayed = record is not None
+        if record is None:
+            record, replayed = await self._execute(scope, body, cache_key, fingerprint)
+
+        if replayed and record["fingerprint"] != fingerprint:
+            record = _json_error(422, "Idempotency-Key was already used with a different request body")
+        elif replayed:
+            record = dict(record, replayed=True)
+        await self._send(send, record)
+
+    async def _execute(self, scope, body: bytes, cache_key: str, fingerprint: str):
+        """
+        Run the endpoint once and store its response under cache_key.
+
+        Returns (record, replayed); replayed is True when another worker had
+        already stored a response for the key.
+        """
+        # Registered before the first await so concurrent duplicates wait on it
+        future = asyncio.get_running_loop().create_future()
+        in_flight[cache_key] = future
+        stored = None
+        try:
+            db = get_database()
+            existing = await db.idempotency_keys.find_one({"_id": cache_key})
+            if existing is not None and "status_code" in existing:
+                stored = _stored_record(existing)
+                response_cache.set(cache_key, stored, existing.get("expires_at"))
+                return stored, True
+
+            now = _now()
+            lease = {
+                "fingerprint": fingerprint,
+                "created_at": now,
+                "expires_at": now + timedelta(seconds=settings.idempotency_lock_seconds),
+            }
+            try:
+                await db.idempotency_keys.insert_one(dict(lease, _id=cache_key))
+            except DuplicateKeyError:
+                # Take over the key if the worker holding it died before finishing
+                taken = await db.idempotency_keys.find_one_and_update(
+                    {"_id": cache_key, "status_code": {"$exists": False}, "expires_at": {"$lt": now}},
+                    {"$set": lease},
+                    return_document=ReturnDocument.AFTER
+                )
+                if taken is None:
+                    existing = await db.idempotency_keys.find_one({"_id": cache_key})
+                    if existing is not None and "status_code" in existing:
+                        stored = _stored_record(existing)
+                        response_cache.set(cache_key, stored, existing.get("expires_at"))
+                        return stored, True
+                    # Another worker holds a live lease and has not finished yet
+                    return _json_error(409, "A request with this Idempotency-Key is already in progress"), False
+
+            # Later writes only apply while this request still holds the lease
+            lease_filter = {"_id": cache_key, "expires_at": lease["expires_at"], "status_code": {"$exists": False}}
+
+            try:
+                record = await self._capture(scope, body)
+            except BaseException:
+                await db.idempotency_keys.delete_one(lease_filter)
+                raise
+
+            if not 200 <= record["status"] < 300:
+                # Only successes are replayed; errors such as 409 "try again" or
+                # a 5xx must let the client retry for real
+                await db.idempotency_keys.delete_one(lease_filter)
+                return record, False
+
+            record["fingerprint"] = fingerprint
+            expires_at = datetime.utcnow() + timedelta(seconds=settings.idempotency_ttl_seconds)
+            await db.idempotency_keys.update_one(
+                lease_filter,
+                {"$set": {
+                    "expires_at": expires_at,
+                    "status_code": record["status"],
+                    "headers": [(k.decode("latin-1"), v.decode("latin-1")) for k, v in record["headers"]],
+                    "body": record["body"],
+                }}
+            )
+            response_cache.set(cache_key, record, expires_at)
+            stored = record
+            return record, False
+        finally:
+            in_flight.pop(cache_key, None)
+            future.set_result(stored)
+
+    async def _capture(self, scope, body: bytes) -> dict:
+        """Call the app with a buffered body and collect its response"""
+        response = {"status": 500, "headers": [], "body": b""}
+        chunks = []
+        body_sent = False
+
+        async def receive():
+            nonlocal body_sent
+            if body_sent:
+                return {"type": "http.disconnect"}
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [(k, v) for k, v in message.get("headers", []) if k.lower() in REPLAY_HEADERS]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        response["body"] = b"".join(chunks)
+        return response
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        return b"".join(chunks)
+
+    @staticmethod
+    async def _send(send, record: dict):
+        headers = list(record["headers"])
+        headers.append((b"content-length", str(len(record["body"])).encode("latin-1")))
+        if record.get("replayed"):
+            headers.append((REPLAYED_HEADER, b"true"))
+        await send({"type": "http.response.start", "status": record["status"], "headers": headers})
+        await send({"type": "http.response.body", "body": record["body"]})
@@ -1,18 +1,61 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
+from pymongo.errors import OperationFailure, PyMongoError
 
 from config import settings
-from database import connect_to_mongo, close_mongo_connection
-from routers import auth, tasks, notes, goals, routines
+from database import connect_to_mongo, close_mongo_connection, ping_mongo
+from idempotency import IdempotencyMiddleware, ensure_idempotency_indexes
+from pubsub import broker
+from routers import auth, tasks, notes, goals, routines, events
+
+
+async def warm_up(app: FastAPI):
+    """
+    Finish startup work once the server is already accepting requests.
+
+    Keeps the Mongo ping and index creation off the cold-start path;
+    /api/ready reports ready only after this completes.
+    """
+    while True:
+        try:
+            await ping_mongo()
+            break
+        except Exception as e:
+            print(f"❌ MongoDB not reachable yet, retrying in {settings.startup_retry_seconds}s: {e}")
+            await asyncio.sleep(settings.startup_retry_seconds)
+    while True:
+        try:
+            await ensure_idempotency_indexes()
+            break
+        except OperationFailure as e:
+            # Rejected by the server (e.g. conflicting index options); retrying won't help
+            print(f"❌ Index creation failed, continuing without it: {e}")
+            break
+        except PyMongoError as e:
+            # Transient (reconnect, timeout, server selection); same retry as the ping
+            print(f"❌ Index creation failed, retrying in {settings.startup_retry_seconds}s: {e}")
+            await asyncio.sleep(settings.startup_retry_seconds)
+    app.state.ready = True
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
+    # Startup: only cheap, non-blocking work before serving
+    app.state.ready = False
     await connect_to_mongo()
+    await broker.start()
+    warm_up_task = asyncio.create_task(warm_up(app))
     yield
     # Shutdown
+    warm_up_task.cancel()
+    try:
+        await warm_up_task
+    except asyncio.CancelledError:
+        pass
+    await broker.stop()
     await close_mongo_connection()
 
 
@@ -23,7 +66,10 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# CORS middleware
+# Replay retried POSTs that carry an Idempotency-Key
+app.add_middleware(IdempotencyMiddleware)
+
+# CORS middleware (added last so it wraps idempotency replays too)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_origins_list,
@@ -38,6 +84,7 @@ app.include_router(tasks.router)
 app.include_router(notes.router)
 app.include_router(goals.router)
 app.include_router(routines.router)
+app.include_router(events.router)
 
 
 @app.get("/")
@@ -50,6 +97,13 @@ async def health_check():
     return {"status": "OK", "message": "Server is running"}
 
 
+@app.get("/api/ready")
+async def readiness_check():
+    if not app.state.ready:
+        return JSONResponse(status_code=503, content={"status": "STARTING", "message": "Server is warming up"})
+    return {"status": "OK", "message": "Server is ready"}
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=settings.port, reload=True)
@@ -129,10 +129,25 @@ class NoteResponse(NoteBase):
 
 # Goal Models
 class Milestone(BaseModel):
+    id: str = Field(default_factory=lambda: str(ObjectId()))
     title: str
     completed: bool = False
 
 
+class MilestoneCreate(BaseModel):
+    title: str
+    completed: bool = False
+
+
+class MilestoneUpdate(BaseModel):
+    title: Optional[str] = None
+    completed: Optional[bool] = None
+
+
+class MilestoneReorder(BaseModel):
+    milestone_ids: List[str]
+
+
 class GoalBase(BaseModel):
     title: str
     description: Optional[str] = None
@@ -177,6 +192,16 @@ class GoalResponse(GoalBase):
 
 
 # Routine Models
+class RoutineStats(BaseModel):
+    current_streak: int = 0
+    longest_streak: int = 0
+    streak_end: Optional[str] = None
+    total_completions: int = 0
+    completed_7d: int = 0
+    completed_30d: int = 0
+    as_of: Optional[str] = None
+
+
 class RoutineBase(BaseModel):
     title: str
     description: Optional[str] = None
@@ -212,6 +237,16 @@ class RoutineInDB(RoutineBase):
 class RoutineResponse(RoutineBase):
     id: str = Field(alias="_id")
     created_at: datetime
+    stats: Optional[RoutineStats] = None
+
+    class Config:
+        populate_by_name = True
+
+
+class RoutineStatsResponse(BaseModel):
+    id: str = Field(alias="_id")
+    title: str
+    stats: RoutineStats
 
     class Config:
         populate_by_name = True
@@ -223,5 +258,10 @@ class Token(BaseModel):
     token_type: str = "bearer"
 
 
+class StreamToken(BaseModel):
+    token: str
+    expires_in: int
+
+
 class TokenData(BaseModel):
     user_id: Optional[str] = None
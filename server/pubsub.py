@@ -0,0 +1,180 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, Optional, Set
+
+from pymongo.errors import OperationFailure
+
+from config import settings
+from database import get_database
+
+# Pushed to a subscriber's queue when it is dropped for falling behind
+SLOW_CONSUMER = None
+
+# Server error code when a change stream cannot resume from its token
+CHANGE_STREAM_HISTORY_LOST = 286
+
+
+class Subscription:
+    """One connection's bounded queue of events"""
+
+    def __init__(self, user_id: str, max_size: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self.dropped = False
+
+    def push(self, event: dict):
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow consumer: discard its backlog and wake it up to disconnect
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(SLOW_CONSUMER)
+
+    async def get(self) -> Optional[dict]:
+        """Next event, or SLOW_CONSUMER once the subscription was dropped"""
+        return await self.queue.get()
+
+
+class LocalEventSource:
+    """Deliver events straight to subscribers in this process"""
+
+    def __init__(self):
+        self._dispatch: Callable[[dict], None] = lambda event: None
+
+    async def start(self, dispatch: Callable[[dict], None]):
+        self._dispatch = dispatch
+
+    async def stop(self):
+        pass
+
+    async def publish(self, event: dict):
+        self._dispatch(event)
+
+
+class MongoChangeStreamSource:
+    """
+    Fan events out across workers through a Mongo change stream.
+
+    publish() inserts into the events collection and every worker's watcher
+    dispatches the inserted documents to its own subscribers. Needs a replica
+    set (Atlas clusters are).
+    """
+
+    def __init__(self, ttl_seconds: int = 3600):
+        self.ttl_seconds = ttl_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, dispatch: Callable[[dict], None]):
+        self._task = asyncio.create_task(self._watch(dispatch))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def publish(self, event: dict):
+        db = get_database()
+        await db.events.insert_one(dict(event, created_at=datetime.utcnow()))
+
+    async def _watch(self, dispatch: Callable[[dict], None]):
+        db = get_database()
+        # Resuming from the last seen change replays events published while reconnecting
+        resume_token = None
+        while True:
+            try:
+                # Created here rather than in start() to keep it off the startup path
+                await db.events.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+                async with db.events.watch(
+                    [{"$match": {"operationType": "insert"}}], resume_after=resume_token
+                ) as stream:
+                    async for change in stream:
+                        event = change["fullDocument"]
+                        event.pop("_id", None)
+                        event.pop("created_at", None)
+                        dispatch(event)
+                        resume_token = stream.resume_token
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    # The oplog no longer reaches back to the token; start from now
+                    print(f"❌ Event change stream history lost, events may have been missed: {e}")
+                    resume_token = None
+                else:
+                    print(f"❌ Event change stream error: {e}")
+                await asyncio.sleep(1)
+            except Exception as e:
+                print(f"❌ Event change stream error: {e}")
+                await asyncio.sleep(1)
+
+
+class EventBroker:
+    """In-process pub/sub of per-user change events"""
+
+    def __init__(self, source=None, queue_size: int = 100):
+        self.source = source or LocalEventSource()
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[Subscription]] = defaultdict(set)
+
+    async def start(self):
+        await self.source.start(self.dispatch)
+
+    async def stop(self):
+        await self.source.stop()
+
+    def subscribe(self, user_id: str) -> Subscription:
+        subscription = Subscription(user_id, self.queue_size)
+        self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.user_id]
+
+    def dispatch(self, event: dict):
+        for subscription in list(self._subscribers.get(event["user"], ())):
+            subscription.push(event)
+
+    async def publish(self, user_id, resource: str, action: str, resource_id: str, data: Optional[dict] = None):
+        """Publish a create/update/delete of one of the user's resources"""
+        await self.source.publish({
+            "user": str(user_id),
+            "type": f"{resource}.{action}",
+            "id": resource_id,
+            "data": data,
+        })
+
+
+def create_broker() -> EventBroker:
+    """Build the broker for the configured event source"""
+    if settings.event_source == "mongo":
+        source = MongoChangeStreamSource()
+    else:
+        source = LocalEventSource()
+    return EventBroker(source, queue_size=settings.event_queue_size)
+
+
+broker = create_broker()
+
+
+async def publish(user_id, resource: str, action: str, resource_id: str, data=None):
+    """Publish a change event; data may be a response model"""
+    if hasattr(data, "model_dump"):
+        data = data.model_dump(mode="json", by_alias=True)
+    try:
+        await broker.publish(user_id, resource, action, resource_id, data)
+    except Exception as e:
+        # The write already succeeded; a missed event only delays other devices
+        print(f"❌ Error publishing {resource}.{action} event: {e}")
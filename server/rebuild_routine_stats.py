@@ -0,0 +1,30 @@
+"""
+Rebuild stored routine stats from each routine's completions map.
+
+Run once after deploying routine stats, or whenever stats look out of sync:
+
+    python rebuild_routine_stats.py
+"""
+import asyncio
+
+from database import connect_to_mongo, close_mongo_connection, get_database
+from routine_stats import compute_stats
+
+
+async def rebuild_routine_stats():
+    """Recompute stats for every routine"""
+    await connect_to_mongo()
+    try:
+        db = get_database()
+        count = 0
+        async for routine in db.routines.find({}, {"completions": 1}):
+            stats = compute_stats(routine.get("completions", {}))
+            await db.routines.update_one({"_id": routine["_id"]}, {"$set": {"stats": stats}})
+            count += 1
+        print(f"✅ Rebuilt stats for {count} routines")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(rebuild_routine_stats())
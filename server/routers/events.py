@@ -0,0 +1,130 @@
+import asyncio
+import json
+from datetime import timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from auth import create_access_token, get_current_user, get_user_from_token
+from config import settings
+from models import StreamToken, UserInDB
+from pubsub import SLOW_CONSUMER, broker
+
+router = APIRouter(prefix="/api/events", tags=["events"])
+
+# EventSource and browser WebSockets cannot set headers, so they pass ?token=.
+# Query strings end up in access logs, so only short-lived stream tokens are
+# accepted there, never the 30-day access token.
+STREAM_TOKEN_SCOPE = "events"
+optional_security = HTTPBearer(auto_error=False)
+
+
+def _event_payload(event: dict) -> dict:
+    return {"type": event["type"], "id": event["id"], "data": event["data"]}
+
+
+def format_sse(event: dict) -> str:
+    """Frame an event as a Server-Sent Events message"""
+    return f"event: {event['type']}\ndata: {json.dumps(_event_payload(event))}\n\n"
+
+
+@router.post("/token", response_model=StreamToken)
+async def create_stream_token(current_user: UserInDB = Depends(get_current_user)):
+    """Issue a short-lived token for opening an event stream with ?token="""
+    token = create_access_token(
+        data={"id": str(current_user.id), "scope": STREAM_TOKEN_SCOPE},
+        expires_delta=timedelta(seconds=settings.event_token_expire_seconds)
+    )
+    return StreamToken(token=token, expires_in=settings.event_token_expire_seconds)
+
+
+@router.get("/")
+async def stream_events(
+    request: Request,
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+):
+    """Stream the current user's create/update/delete events as Server-Sent Events"""
+    if credentials:
+        current_user = await get_user_from_token(credentials.credentials)
+    elif token:
+        current_user = await get_user_from_token(token, scope=STREAM_TOKEN_SCOPE)
+    else:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    subscription = broker.subscribe(str(current_user.id))
+
+    async def event_stream():
+        try:
+            yield ": connected\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.get(), settings.event_heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                if event is SLOW_CONSUMER:
+                    yield "event: overflow\ndata: {}\n\n"
+                    break
+                yield format_sse(event)
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _wait_for_disconnect(websocket: WebSocket):
+    """Read (and ignore) client messages until the client goes away"""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+
+@router.websocket("/ws")
+async def websocket_events(websocket: WebSocket, token: str):
+    """Push the current user's change events over a WebSocket"""
+    try:
+        current_user = await get_user_from_token(token, scope=STREAM_TOKEN_SCOPE)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    subscription = broker.subscribe(str(current_user.id))
+    # Reading alongside the queue notices a closed socket as soon as it closes,
+    # not at the next send, so quiet connections are unsubscribed promptly
+    disconnected = asyncio.create_task(_wait_for_disconnect(websocket))
+    next_event = None
+    try:
+        while True:
+            if next_event is None:
+                next_event = asyncio.create_task(subscription.get())
+            done, _ = await asyncio.wait(
+                {disconnected, next_event},
+                timeout=settings.event_heartbeat_seconds,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnected in done:
+                break
+            if next_event not in done:
+                await websocket.send_json({"type": "ping"})
+                continue
+            event = next_event.result()
+            next_event = None
+            if event is SLOW_CONSUMER:
+                await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Client is too slow")
+                break
+            await websocket.send_json(_event_payload(event))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broker.unsubscribe(subscription)
+        for task in (disconnected, next_event):
+            if task is not None:
+                task.cancel()
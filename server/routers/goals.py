@@ -1,14 +1,107 @@
 from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
+from typing import List, Optional
 from bson import ObjectId
 from datetime import datetime
+from pymongo import ReturnDocument
 
 from database import get_database
-from models import GoalCreate, GoalUpdate, GoalResponse, UserInDB
+from models import (
+    GoalCreate, GoalUpdate, GoalResponse, Milestone, MilestoneCreate, MilestoneUpdate, MilestoneReorder, UserInDB
+)
 from auth import get_current_user
+from pubsub import publish
 
 router = APIRouter(prefix="/api/goals", tags=["goals"])
 
+# Percentage of completed milestones, rounded like the client's Math.round;
+# goals without milestones keep their manually set progress
+PROGRESS_EXPR = {
+    "$cond": [
+        {"$gt": [{"$size": "$milestones"}, 0]},
+        {"$toInt": {"$floor": {"$add": [
+            {"$multiply": [100, {"$divide": [
+                {"$size": {"$filter": {"input": "$milestones", "cond": "$$this.completed"}}},
+                {"$size": "$milestones"}
+            ]}]},
+            0.5
+        ]}}},
+        {"$ifNull": ["$progress", 0]}
+    ]
+}
+
+
+def milestone_progress(milestones: List[dict], progress: int) -> int:
+    """Python twin of PROGRESS_EXPR for writes that replace the whole list"""
+    if not milestones:
+        return progress
+    completed = sum(1 for m in milestones if m.get("completed"))
+    # Divide first, like PROGRESS_EXPR and the client's Math.round(c / n * 100):
+    # 23/40 is 57.49999... that way and rounds to 57
+    return int(completed / len(milestones) * 100 + 0.5)
+
+
+def with_milestone_ids(milestones: List[dict]) -> List[dict]:
+    """Give milestones saved before they had ids a new one; existing ids are kept"""
+    return [m if m.get("id") else dict(m, id=str(ObjectId())) for m in milestones]
+
+
+async def backfill_milestone_ids(db, goal: dict) -> dict:
+    """
+    Persist ids for a goal's legacy milestones before it is returned.
+
+    Without this the response model would invent a fresh id on every read,
+    which the milestone endpoints could then never find.
+    """
+    milestones = goal.get("milestones", [])
+    if all(m.get("id") for m in milestones):
+        return goal
+    backfilled = with_milestone_ids(milestones)
+    result = await db.goals.update_one(
+        {"_id": goal["_id"], "milestones": milestones}, {"$set": {"milestones": backfilled}}
+    )
+    if result.matched_count:
+        return dict(goal, milestones=backfilled)
+    # Changed concurrently; backfill whatever is stored now
+    current = await db.goals.find_one({"_id": goal["_id"]})
+    return await backfill_milestone_ids(db, current) if current else goal
+
+
+async def update_milestones(
+    goal_id: str,
+    milestone_filter: dict,
+    milestones_expr,
+    current_user: UserInDB,
+    mismatch_error: Optional[HTTPException] = None
+) -> GoalResponse:
+    """
+    Rewrite a goal's milestones server-side and re-derive its progress.
+
+    One atomic pipeline update that also returns the new document, so the
+    client never resends the list and no re-read is needed. mismatch_error is
+    raised when the goal exists but milestone_filter does not match it
+    (default: 404 Milestone not found).
+    """
+    db = get_database()
+    
+    updated_goal = await db.goals.find_one_and_update(
+        {"_id": ObjectId(goal_id), "user": current_user.id, **milestone_filter},
+        [
+            {"$set": {"milestones": milestones_expr}},
+            {"$set": {"progress": PROGRESS_EXPR, "updatedAt": datetime.utcnow()}},
+        ],
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated_goal:
+        goal = await db.goals.find_one({"_id": ObjectId(goal_id), "user": current_user.id}, {"_id": 1})
+        if not goal:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Goal not found")
+        raise mismatch_error or HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Milestone not found")
+    
+    updated_goal = await backfill_milestone_ids(db, updated_goal)
+    response = GoalResponse(_id=str(updated_goal["_id"]), **{k: v for k, v in updated_goal.items() if k != "_id" and k != "user"})
+    await publish(current_user.id, "goal", "updated", response.id, response)
+    return response
+
 
 @router.get("/", response_model=List[GoalResponse])
 async def get_goals(current_user: UserInDB = Depends(get_current_user)):
@@ -16,6 +109,8 @@ async def get_goals(current_user: UserInDB = Depends(get_current_user)):
     db = get_database()
     goals = await db.goals.find({"user": current_user.id}).sort("createdAt", -1).to_list(length=None)
     
+    goals = [await backfill_milestone_ids(db, goal) for goal in goals]
+    
     return [GoalResponse(_id=str(goal["_id"]), **{k: v for k, v in goal.items() if k != "_id" and k != "user"}) for goal in goals]
 
 
@@ -26,13 +121,16 @@ async def create_goal(goal_data: GoalCreate, current_user: UserInDB = Depends(ge
     
     goal_dict = goal_data.model_dump()
     goal_dict["user"] = current_user.id
+    goal_dict["progress"] = milestone_progress(goal_dict["milestones"], goal_dict["progress"])
     goal_dict["createdAt"] = datetime.utcnow()
     goal_dict["updatedAt"] = datetime.utcnow()
     
     result = await db.goals.insert_one(goal_dict)
     created_goal = await db.goals.find_one({"_id": result.inserted_id})
     
-    return GoalResponse(_id=str(created_goal["_id"]), **{k: v for k, v in created_goal.items() if k != "_id" and k != "user"})
+    response = GoalResponse(_id=str(created_goal["_id"]), **{k: v for k, v in created_goal.items() if k != "_id" and k != "user"})
+    await publish(current_user.id, "goal", "created", response.id, response)
+    return response
 
 
 @router.put("/{goal_id}", response_model=GoalResponse)
@@ -43,14 +141,20 @@ async def update_goal(goal_id: str, goal_data: GoalUpdate, current_user: UserInD
     goal = await db.goals.find_one({"_id": ObjectId(goal_id), "user": current_user.id})
     if not goal:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Goal not found")
+    goal = await backfill_milestone_ids(db, goal)
     
     update_data = {k: v for k, v in goal_data.model_dump(exclude_unset=True).items() if v is not None}
+    milestones = update_data.get("milestones", goal.get("milestones", []))
+    if milestones:
+        update_data["progress"] = milestone_progress(milestones, goal.get("progress", 0))
     if update_data:
         update_data["updatedAt"] = datetime.utcnow()
         await db.goals.update_one({"_id": ObjectId(goal_id)}, {"$set": update_data})
     
     updated_goal = await db.goals.find_one({"_id": ObjectId(goal_id)})
-    return GoalResponse(_id=str(updated_goal["_id"]), **{k: v for k, v in updated_goal.items() if k != "_id" and k != "user"})
+    response = GoalResponse(_id=str(updated_goal["_id"]), **{k: v for k, v in updated_goal.items() if k != "_id" and k != "user"})
+    await publish(current_user.id, "goal", "updated", response.id, response)
+    return response
 
 
 @router.delete("/{goal_id}")
@@ -63,4 +167,92 @@ async def delete_goal(goal_id: str, current_user: UserInDB = Depends(get_current
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Goal not found")
     
     await db.goals.delete_one({"_id": ObjectId(goal_id)})
+    await publish(current_user.id, "goal", "deleted", goal_id)
     return {"message": "Goal deleted successfully"}
+
+
+@router.post("/{goal_id}/milestones", response_model=GoalResponse, status_code=status.HTTP_201_CREATED)
+async def add_milestone(goal_id: str, milestone_data: MilestoneCreate, current_user: UserInDB = Depends(get_current_user)):
+    """Append a milestone to a goal"""
+    milestone = Milestone(**milestone_data.model_dump()).model_dump()
+    return await update_milestones(
+        goal_id, {}, {"$concatArrays": [{"$ifNull": ["$milestones", []]}, [{"$literal": milestone}]]}, current_user
+    )
+
+
+@router.put("/{goal_id}/milestones/order", response_model=GoalResponse)
+async def reorder_milestones(goal_id: str, order: MilestoneReorder, current_user: UserInDB = Depends(get_current_user)):
+    """Reorder a goal's milestones; milestone_ids must list every milestone exactly once"""
+    ids = order.milestone_ids
+    not_a_permutation = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="milestone_ids must list every milestone exactly once"
+    )
+    if len(set(ids)) != len(ids):
+        raise not_a_permutation
+    
+    # The filter only matches when ids is a permutation of the stored milestones
+    milestone_filter = {"milestones": {"$size": len(ids)}}
+    if ids:
+        milestone_filter["milestones.id"] = {"$all": ids}
+    return await update_milestones(
+        goal_id,
+        milestone_filter,
+        {"$map": {
+            "input": {"$literal": ids},
+            "as": "milestoneId",
+            "in": {"$arrayElemAt": [
+                {"$filter": {"input": "$milestones", "cond": {"$eq": ["$$this.id", "$$milestoneId"]}}}, 0
+            ]}
+        }},
+        current_user,
+        mismatch_error=not_a_permutation
+    )
+
+
+@router.put("/{goal_id}/milestones/{milestone_id}", response_model=GoalResponse)
+async def update_milestone(goal_id: str, milestone_id: str, milestone_data: MilestoneUpdate, current_user: UserInDB = Depends(get_current_user)):
+    """Rename a milestone or set its completion"""
+    changes = {k: v for k, v in milestone_data.model_dump(exclude_unset=True).items() if v is not None}
+    return await update_milestones(
+        goal_id,
+        {"milestones.id": milestone_id},
+        {"$map": {
+            "input": "$milestones",
+            "in": {"$cond": [
+                {"$eq": ["$$this.id", {"$literal": milestone_id}]},
+                {"$mergeObjects": ["$$this", {"$literal": changes}]},
+                "$$this"
+            ]}
+        }},
+        current_user
+    )
+
+
+@router.post("/{goal_id}/milestones/{milestone_id}/toggle", response_model=GoalResponse)
+async def toggle_milestone(goal_id: str, milestone_id: str, current_user: UserInDB = Depends(get_current_user)):
+    """Toggle a milestone's completion"""
+    return await update_milestones(
+        goal_id,
+        {"milestones.id": milestone_id},
+        {"$map": {
+            "input": "$milestones",
+            "in": {"$cond": [
+                {"$eq": ["$$this.id", {"$literal": milestone_id}]},
+                {"$mergeObjects": ["$$this", {"completed": {"$not": ["$$this.completed"]}}]},
+                "$$this"
+            ]}
+        }},
+        current_user
+    )
+
+
+@router.delete("/{goal_id}/milestones/{milestone_id}", response_model=GoalResponse)
+async def delete_milestone(goal_id: str, milestone_id: str, current_user: UserInDB = Depends(get_current_user)):
+    """Remove a milestone from a goal"""
+    return await update_milestones(
+        goal_id,
+        {"milestones.id": milestone_id},
+        {"$filter": {"input": "$milestones", "cond": {"$ne": ["$$this.id", {"$literal": milestone_id}]}}},
+        current_user
+    )
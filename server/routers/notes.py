@@ -6,6 +6,7 @@ from datetime import datetime
 from database import get_database
 from models import NoteCreate, NoteUpdate, NoteResponse, UserInDB
 from auth import get_current_user
+from pubsub import publish
 
 router = APIRouter(prefix="/api/notes", tags=["notes"])
 
@@ -32,7 +33,9 @@ async def create_note(note_data: NoteCreate, current_user: UserInDB = Depends(ge
     result = await db.notes.insert_one(note_dict)
     created_note = await db.notes.find_one({"_id": result.inserted_id})
     
-    return NoteResponse(_id=str(created_note["_id"]), **{k: v for k, v in created_note.items() if k != "_id" and k != "user"})
+    response = NoteResponse(_id=str(created_note["_id"]), **{k: v for k, v in created_note.items() if k != "_id" and k != "user"})
+    await publish(current_user.id, "note", "created", response.id, response)
+    return response
 
 
 @router.put("/{note_id}", response_model=NoteResponse)
@@ -50,7 +53,9 @@ async def update_note(note_id: str, note_data: NoteUpdate, current_user: UserInD
         await db.notes.update_one({"_id": ObjectId(note_id)}, {"$set": update_data})
     
     updated_note = await db.notes.find_one({"_id": ObjectId(note_id)})
-    return NoteResponse(_id=str(updated_note["_id"]), **{k: v for k, v in updated_note.items() if k != "_id" and k != "user"})
+    response = NoteResponse(_id=str(updated_note["_id"]), **{k: v for k, v in updated_note.items() if k != "_id" and k != "user"})
+    await publish(current_user.id, "note", "updated", response.id, response)
+    return response
 
 
 @router.delete("/{note_id}")
@@ -63,4 +68,5 @@ async def delete_note(note_id: str, current_user: UserInDB = Depends(get_current
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Note not found")
     
     await db.notes.delete_one({"_id": ObjectId(note_id)})
+    await publish(current_user.id, "note", "deleted", note_id)
     return {"message": "Note deleted successfully"}
@@ -1,13 +1,44 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from typing import List
 from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
 
 from database import get_database
-from models import RoutineCreate, RoutineUpdate, RoutineResponse, UserInDB
+from models import RoutineCreate, RoutineUpdate, RoutineResponse, RoutineStatsResponse, UserInDB
 from auth import get_current_user
+from pubsub import publish
+from routine_stats import apply_toggle, compute_stats, effective_stats, is_day, parse_day, roll_forward, window_days
 
 router = APIRouter(prefix="/api/routines", tags=["routines"])
 
+# Optimistic retries for toggles that race with another write to the same routine
+TOGGLE_ATTEMPTS = 5
+
+
+def routine_response(routine: dict) -> RoutineResponse:
+    """Build a RoutineResponse with stats moved to the current day"""
+    fields = {k: v for k, v in routine.items() if k not in ("_id", "user", "stats")}
+    stats = routine.get("stats")
+    if stats is not None:
+        stats = effective_stats(roll_forward(stats, routine.get("completions", {})))
+    return RoutineResponse(_id=str(routine["_id"]), stats=stats, **fields)
+
+
+def roll_routine_stats(routine: dict):
+    """
+    Move routine["stats"] to the current day in place.
+
+    Returns an UpdateOne that persists the rolled stats when they were stale,
+    guarded on the old as_of so a concurrent toggle is never overwritten;
+    None when the stats were already current.
+    """
+    stats = routine["stats"]
+    rolled = roll_forward(stats, routine.get("completions", {}))
+    if rolled is stats:
+        return None
+    routine["stats"] = rolled
+    return UpdateOne({"_id": routine["_id"], "stats.as_of": stats.get("as_of")}, {"$set": {"stats": rolled}})
+
 
 @router.get("/", response_model=List[RoutineResponse])
 async def get_routines(current_user: UserInDB = Depends(get_current_user)):
@@ -15,7 +46,41 @@ async def get_routines(current_user: UserInDB = Depends(get_current_user)):
     db = get_database()
     routines = await db.routines.find({"user": current_user.id}).sort("createdAt", -1).to_list(length=None)
     
-    return [RoutineResponse(_id=str(routine["_id"]), **{k: v for k, v in routine.items() if k != "_id" and k != "user"}) for routine in routines]
+    writes = [roll_routine_stats(routine) for routine in routines if routine.get("stats")]
+    writes = [write for write in writes if write is not None]
+    if writes:
+        await db.routines.bulk_write(writes, ordered=False)
+    
+    return [routine_response(routine) for routine in routines]
+
+
+@router.get("/stats", response_model=List[RoutineStatsResponse])
+async def get_routine_stats(current_user: UserInDB = Depends(get_current_user)):
+    """Get streak and completion stats for all routines without loading their history"""
+    db = get_database()
+    # Only the days inside the rolling windows are loaded, in case stats need rolling forward
+    projection = {"title": 1, "stats": 1, **{f"completions.{day}": 1 for day in window_days()}}
+    routines = await db.routines.find(
+        {"user": current_user.id, "stats": {"$exists": True}}, projection
+    ).to_list(length=None)
+    writes = [roll_routine_stats(routine) for routine in routines]
+
+    # Routines created before stats existed are backfilled on first read
+    missing = await db.routines.find({"user": current_user.id, "stats": {"$exists": False}}).to_list(length=None)
+    for routine in missing:
+        routine["stats"] = compute_stats(routine.get("completions", {}))
+        writes.append(UpdateOne({"_id": routine["_id"], "stats": {"$exists": False}}, {"$set": {"stats": routine["stats"]}}))
+    routines.extend(missing)
+
+    # Stale stats are written back once, so later reads today skip the rolling
+    writes = [write for write in writes if write is not None]
+    if writes:
+        await db.routines.bulk_write(writes, ordered=False)
+
+    return [
+        RoutineStatsResponse(_id=str(routine["_id"]), title=routine["title"], stats=effective_stats(routine["stats"]))
+        for routine in routines
+    ]
 
 
 @router.post("/", response_model=RoutineResponse, status_code=status.HTTP_201_CREATED)
@@ -24,12 +89,17 @@ async def create_routine(routine_data: RoutineCreate, current_user: UserInDB = D
     db = get_database()
     
     routine_dict = routine_data.model_dump(by_alias=True)
+    if not all(is_day(day) for day in routine_dict.get("completions", {})):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid completion date, expected YYYY-MM-DD")
     routine_dict["user"] = current_user.id
+    routine_dict["stats"] = compute_stats(routine_dict.get("completions", {}))
     
     result = await db.routines.insert_one(routine_dict)
     created_routine = await db.routines.find_one({"_id": result.inserted_id})
     
-    return RoutineResponse(_id=str(created_routine["_id"]), **{k: v for k, v in created_routine.items() if k != "_id" and k != "user"})
+    response = routine_response(created_routine)
+    await publish(current_user.id, "routine", "created", response.id, response)
+    return response
 
 
 @router.put("/{routine_id}", response_model=RoutineResponse)
@@ -46,7 +116,9 @@ async def update_routine(routine_id: str, routine_data: RoutineUpdate, current_u
         await db.routines.update_one({"_id": ObjectId(routine_id)}, {"$set": update_data})
     
     updated_routine = await db.routines.find_one({"_id": ObjectId(routine_id)})
-    return RoutineResponse(_id=str(updated_routine["_id"]), **{k: v for k, v in updated_routine.items() if k != "_id" and k != "user"})
+    response = routine_response(updated_routine)
+    await publish(current_user.id, "routine", "updated", response.id, response)
+    return response
 
 
 @router.delete("/{routine_id}")
@@ -59,6 +131,7 @@ async def delete_routine(routine_id: str, current_user: UserInDB = Depends(get_c
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Routine not found")
     
     await db.routines.delete_one({"_id": ObjectId(routine_id)})
+    await publish(current_user.id, "routine", "deleted", routine_id)
     return {"message": "Routine deleted successfully"}
 
 
@@ -67,19 +140,41 @@ async def toggle_routine_completion(routine_id: str, date: str, current_user: Us
     """Toggle routine completion for a specific date"""
     db = get_database()
     
-    routine = await db.routines.find_one({"_id": ObjectId(routine_id), "user": current_user.id})
-    if not routine:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Routine not found")
+    try:
+        day = parse_day(date)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid date, expected YYYY-MM-DD")
     
-    # Toggle completion
-    completions = routine.get("completions", {})
-    current_status = completions.get(date, False)
-    completions[date] = not current_status
+    for _ in range(TOGGLE_ATTEMPTS):
+        routine = await db.routines.find_one({"_id": ObjectId(routine_id), "user": current_user.id})
+        if not routine:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Routine not found")
+        
+        # Toggle completion
+        completions = routine.get("completions", {})
+        current_status = completions.get(date, False)
+        completions[date] = not current_status
+        old_stats = routine.get("stats")
+        stats = apply_toggle(dict(old_stats) if old_stats else None, completions, day)
+        # Stored only, never returned: makes every write change the stats the next guard compares
+        stats["revision"] = (old_stats or {}).get("revision", 0) + 1
+        
+        # Only the toggled day and the stats are written, and only if no other
+        # toggle landed since the read; otherwise re-read and apply again
+        updated_routine = await db.routines.find_one_and_update(
+            {
+                "_id": routine["_id"],
+                "stats": old_stats if old_stats is not None else {"$exists": False},
+                f"completions.{date}": True if current_status else {"$ne": True},
+            },
+            {"$set": {f"completions.{date}": completions[date], "stats": stats}},
+            return_document=ReturnDocument.AFTER
+        )
+        if updated_routine:
+            break
+    else:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Routine was modified concurrently, try again")
     
-    await db.routines.update_one(
-        {"_id": ObjectId(routine_id)},
-        {"$set": {"completions": completions}}
-    )
-    
-    updated_routine = await db.routines.find_one({"_id": ObjectId(routine_id)})
-    return RoutineResponse(_id=str(updated_routine["_id"]), **{k: v for k, v in updated_routine.items() if k != "_id" and k != "user"})
+    response = routine_response(updated_routine)
+    await publish(current_user.id, "routine", "updated", response.id, response)
+    return response
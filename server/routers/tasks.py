@@ -5,6 +5,7 @@ from bson import ObjectId
 from database import get_database
 from models import TaskCreate, TaskUpdate, TaskResponse, UserInDB
 from auth import get_current_user
+from pubsub import publish
 
 router = APIRouter(prefix="/api/tasks", tags=["tasks"])
 
@@ -29,7 +30,9 @@ async def create_task(task_data: TaskCreate, current_user: UserInDB = Depends(ge
     result = await db.tasks.insert_one(task_dict)
     created_task = await db.tasks.find_one({"_id": result.inserted_id})
     
-    return TaskResponse(_id=str(created_task["_id"]), **{k: v for k, v in created_task.items() if k != "_id" and k != "user"})
+    response = TaskResponse(_id=str(created_task["_id"]), **{k: v for k, v in created_task.items() if k != "_id" and k != "user"})
+    await publish(current_user.id, "task", "created", response.id, response)
+    return response
 
 
 @router.put("/{task_id}", response_model=TaskResponse)
@@ -48,7 +51,9 @@ async def update_task(task_id: str, task_data: TaskUpdate, current_user: UserInD
         await db.tasks.update_one({"_id": ObjectId(task_id)}, {"$set": update_data})
     
     updated_task = await db.tasks.find_one({"_id": ObjectId(task_id)})
-    return TaskResponse(_id=str(updated_task["_id"]), **{k: v for k, v in updated_task.items() if k != "_id" and k != "user"})
+    response = TaskResponse(_id=str(updated_task["_id"]), **{k: v for k, v in updated_task.items() if k != "_id" and k != "user"})
+    await publish(current_user.id, "task", "updated", response.id, response)
+    return response
 
 
 @router.delete("/{task_id}")
@@ -62,4 +67,5 @@ async def delete_task(task_id: str, current_user: UserInDB = Depends(get_current
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
     
     await db.tasks.delete_one({"_id": ObjectId(task_id)})
+    await publish(current_user.id, "task", "deleted", task_id)
     return {"message": "Task deleted successfully"}
@@ -0,0 +1,152 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+# Rolling windows kept on every routine, in days
+WINDOWS = (7, 30)
+
+
+def parse_day(value: str) -> date:
+    """Parse a YYYY-MM-DD completion key; other forms fromisoformat accepts are rejected"""
+    day = date.fromisoformat(value)
+    if day.isoformat() != value:
+        raise ValueError(f"Not a YYYY-MM-DD date: {value!r}")
+    return day
+
+
+def is_day(value: str) -> bool:
+    """Whether value is a canonical YYYY-MM-DD completion key"""
+    try:
+        parse_day(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def today() -> date:
+    """Current day used for streaks and rolling windows"""
+    return datetime.utcnow().date()
+
+
+def window_days(as_of: Optional[date] = None) -> List[str]:
+    """Completion keys covered by the widest rolling window ending at as_of"""
+    as_of = as_of or today()
+    return [(as_of - timedelta(days=i)).isoformat() for i in range(max(WINDOWS))]
+
+
+def _window_counts(completions: Dict[str, bool], as_of: date) -> Dict[str, int]:
+    """Count completed days in each rolling window ending at as_of (at most 30 lookups)"""
+    counts = {}
+    for days in WINDOWS:
+        counts[f"completed_{days}d"] = sum(
+            1 for i in range(days) if completions.get((as_of - timedelta(days=i)).isoformat())
+        )
+    return counts
+
+
+def _run_bounds(completions: Dict[str, bool], day: date):
+    """Return (left, right): consecutive completed days directly before and after day"""
+    left = 0
+    while completions.get((day - timedelta(days=left + 1)).isoformat()):
+        left += 1
+    right = 0
+    while completions.get((day + timedelta(days=right + 1)).isoformat()):
+        right += 1
+    return left, right
+
+
+def compute_stats(completions: Dict[str, bool], as_of: Optional[date] = None) -> dict:
+    """Build routine stats from scratch by walking the whole completions map"""
+    as_of = as_of or today()
+    # Legacy keys that are not YYYY-MM-DD can never be looked up by day, so they don't count
+    days = sorted(parse_day(k) for k, v in completions.items() if v and is_day(k))
+
+    longest = 0
+    run = 0
+    previous = None
+    for day in days:
+        run = run + 1 if previous and day - previous == timedelta(days=1) else 1
+        longest = max(longest, run)
+        previous = day
+
+    stats = {
+        "current_streak": run,
+        "longest_streak": longest,
+        "streak_end": previous.isoformat() if previous else None,
+        "total_completions": len(days),
+        "as_of": as_of.isoformat(),
+    }
+    stats.update(_window_counts(completions, as_of))
+    return stats
+
+
+def roll_forward(stats: dict, completions: Dict[str, bool], as_of: Optional[date] = None) -> dict:
+    """Move the rolling windows to as_of; a no-op when stats are already current"""
+    as_of = as_of or today()
+    if stats.get("as_of") == as_of.isoformat():
+        return stats
+    stats = dict(stats)
+    stats["as_of"] = as_of.isoformat()
+    stats.update(_window_counts(completions, as_of))
+    return stats
+
+
+def apply_toggle(stats: Optional[dict], completions: Dict[str, bool], day: date) -> dict:
+    """
+    Update stats after completions[day] was toggled.
+
+    completions must already hold the new value. Only the run around day is
+    walked; a full rebuild happens only when un-checking a day breaks the
+    longest run or removes the most recent one.
+    """
+    if stats is None:
+        return compute_stats(completions)
+
+    windows_current = stats.get("as_of") == today().isoformat()
+    # Rolling forward recounts the windows against the new completions
+    stats = roll_forward(stats, completions)
+    completed = bool(completions.get(day.isoformat()))
+    left, right = _run_bounds(completions, day)
+    run_length = left + 1 + right
+    streak_end = parse_day(stats["streak_end"]) if stats.get("streak_end") else None
+    run_end = day + timedelta(days=right)
+
+    if completed:
+        stats["total_completions"] += 1
+        stats["longest_streak"] = max(stats["longest_streak"], run_length)
+        if streak_end is None or run_end >= streak_end:
+            stats["streak_end"] = run_end.isoformat()
+            stats["current_streak"] = run_length
+    else:
+        stats["total_completions"] -= 1
+        if run_length >= stats["longest_streak"]:
+            return compute_stats(completions)
+        if streak_end is not None and day <= streak_end and run_end == streak_end:
+            if right:
+                stats["current_streak"] = right
+            elif left:
+                stats["streak_end"] = (day - timedelta(days=1)).isoformat()
+                stats["current_streak"] = left
+            else:
+                return compute_stats(completions)
+
+    if not windows_current:
+        return stats
+    as_of = parse_day(stats["as_of"])
+    for days in WINDOWS:
+        if as_of - timedelta(days=days) < day <= as_of:
+            stats[f"completed_{days}d"] += 1 if completed else -1
+    return stats
+
+
+def effective_stats(stats: dict, as_of: Optional[date] = None) -> dict:
+    """
+    Stats as seen on as_of: a streak not extended since yesterday has lapsed.
+
+    The stored write revision is internal and left out.
+    """
+    as_of = as_of or today()
+    stats = {k: v for k, v in stats.items() if k != "revision"}
+    streak_end = stats.get("streak_end")
+    if not streak_end or parse_day(streak_end) < as_of - timedelta(days=1):
+        stats["current_streak"] = 0
+    return stats
@@ -0,0 +1,5 @@
+import os
+
+# Settings are required at import time; tests never connect to MongoDB
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("JWT_SECRET", "test-secret")
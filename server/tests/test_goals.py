@@ -0,0 +1,72 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from models import MilestoneReorder, UserInDB
+from routers import goals
+from routers.goals import milestone_progress, with_milestone_ids
+
+
+def test_progress_is_percentage_of_completed_milestones():
+    milestones = [{"completed": True}, {"completed": False}, {"completed": True}, {"completed": True}]
+
+    assert milestone_progress(milestones, 0) == 75
+
+
+def test_progress_rounds_half_up_like_the_client():
+    # 1/8 = 12.5% and 3/8 = 37.5%: Math.round gives 13 and 38, not banker's 12 and 38
+    assert milestone_progress([{"completed": True}] + [{"completed": False}] * 7, 0) == 13
+    assert milestone_progress([{"completed": True}] * 3 + [{"completed": False}] * 5, 0) == 38
+    assert milestone_progress([{"completed": True}, {"completed": False}, {"completed": False}], 0) == 33
+    # 23 / 40 * 100 is 57.49999... in floating point, so the client shows 57
+    assert milestone_progress([{"completed": True}] * 23 + [{"completed": False}] * 17, 0) == 57
+
+
+def test_progress_bounds():
+    assert milestone_progress([{"completed": False}] * 3, 50) == 0
+    assert milestone_progress([{"completed": True}] * 3, 0) == 100
+
+
+def test_goal_without_milestones_keeps_manual_progress():
+    assert milestone_progress([], 40) == 40
+
+
+def test_with_milestone_ids_keeps_existing_ids():
+    milestones = [{"id": "m1", "title": "Plan"}, {"title": "Build"}, {"id": "", "title": "Ship"}]
+
+    backfilled = with_milestone_ids(milestones)
+
+    assert backfilled[0] == {"id": "m1", "title": "Plan"}
+    assert backfilled[1]["title"] == "Build" and backfilled[1]["id"]
+    assert backfilled[2]["id"] and backfilled[2]["id"] != backfilled[1]["id"]
+    assert "id" not in milestones[1]
+
+
+class GoalsWithoutMatch:
+    """goals collection holding one goal that no milestone filter matches"""
+
+    def __init__(self, goal_id):
+        self.goal_id = goal_id
+
+    async def find_one_and_update(self, *args, **kwargs):
+        return None
+
+    async def find_one(self, query, projection=None):
+        return {"_id": self.goal_id} if query["_id"] == self.goal_id else None
+
+
+@pytest.mark.parametrize("milestone_ids", [["a", "a"], ["a"], ["a", "b", "unknown"]])
+def test_reorder_that_is_not_a_permutation_is_a_bad_request(monkeypatch, milestone_ids):
+    goal_id = ObjectId()
+    db = SimpleNamespace(goals=GoalsWithoutMatch(goal_id))
+    monkeypatch.setattr(goals, "get_database", lambda: db)
+    user = UserInDB.model_construct(id=ObjectId(), email="a@example.com", name="A", password="x")
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(goals.reorder_milestones(str(goal_id), MilestoneReorder(milestone_ids=milestone_ids), user))
+
+    assert error.value.status_code == 400
+    assert error.value.detail == "milestone_ids must list every milestone exactly once"
@@ -0,0 +1,264 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+import idempotency
+from idempotency import IdempotencyMiddleware, ResponseCache
+
+
+def _matches(document: dict, query: dict) -> bool:
+    for field, condition in query.items():
+        value = document.get(field)
+        if isinstance(condition, dict) and "$exists" in condition:
+            if (field in document) != condition["$exists"]:
+                return False
+        elif isinstance(condition, dict) and "$lt" in condition:
+            if value is None or not value < condition["$lt"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCollection:
+    """The few idempotency_keys operations the middleware uses, kept in a dict"""
+
+    def __init__(self):
+        self.documents = {}
+
+    async def find_one(self, query):
+        return next((dict(d) for d in self.documents.values() if _matches(d, query)), None)
+
+    async def insert_one(self, document):
+        if document["_id"] in self.documents:
+            raise DuplicateKeyError("duplicate key")
+        self.documents[document["_id"]] = dict(document)
+
+    async def find_one_and_update(self, query, update, return_document=None):
+        document = await self.find_one(query)
+        if document is None:
+            return None
+        self.documents[document["_id"]].update(update["$set"])
+        return dict(self.documents[document["_id"]])
+
+    async def update_one(self, query, update):
+        document = await self.find_one(query)
+        if document is not None:
+            self.documents[document["_id"]].update(update["$set"])
+
+    async def delete_one(self, query):
+        document = await self.find_one(query)
+        if document is not None:
+            del self.documents[document["_id"]]
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.idempotency_keys = FakeCollection()
+
+
+class StubApp:
+    """ASGI app answering every request with a fixed status, counting calls"""
+
+    def __init__(self, status=201):
+        self.status = status
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        message = await receive()
+        await self.release.wait()
+        body = json.dumps({"call": self.calls, "echo": message["body"].decode()}).encode()
+        await send({"type": "http.response.start", "status": self.status,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+
+@pytest.fixture(autouse=True)
+def fake_database(monkeypatch):
+    db = FakeDatabase()
+    monkeypatch.setattr(idempotency, "get_database", lambda: db)
+    monkeypatch.setattr(idempotency, "response_cache", ResponseCache(100, 3600))
+    monkeypatch.setattr(idempotency, "in_flight", {})
+    return db
+
+
+async def call(app, body=b'{"title": "Write"}', key=b"key-1", authorization=b"Bearer alice", path="/api/tasks/"):
+    """Send one POST through the middleware; returns (status, headers, json body)"""
+    headers = [(b"idempotency-key", key), (b"authorization", authorization)]
+    scope = {"type": "http", "method": "POST", "path": path, "headers": headers}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start = messages[0]
+    return start["status"], dict(start["headers"]), json.loads(messages[1]["body"])
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_retry_replays_stored_response():
+    async def scenario():
+        stub = StubApp()
+        app = IdempotencyMiddleware(stub)
+
+        first = await call(app)
+        second = await call(app)
+
+        assert stub.calls == 1
+        assert first[0] == second[0] == 201
+        assert second[2] == first[2]
+        assert second[1][b"idempotent-replayed"] == b"true"
+        assert b"idempotent-replayed" not in first[1]
+
+    run(scenario())
+
+
+def test_concurrent_duplicates_wait_for_the_first_request():
+    async def scenario():
+        stub = StubApp()
+        stub.release.clear()
+        app = IdempotencyMiddleware(stub)
+
+        requests = [asyncio.create_task(call(app)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        stub.release.set()
+        results = await asyncio.gather(*requests)
+
+        assert stub.calls == 1
+        assert {json.dumps(body) for _, _, body in results} == {json.dumps(results[0][2])}
+        assert all(status == 201 for status, _, _ in results)
+
+    run(scenario())
+
+
+def test_same_key_with_different_body_is_rejected():
+    async def scenario():
+        stub = StubApp()
+        app = IdempotencyMiddleware(stub)
+
+        await call(app, body=b'{"title": "Write"}')
+        status, _, body = await call(app, body=b'{"title": "Read"}')
+
+        assert status == 422
+        assert stub.calls == 1
+        assert "different request body" in body["detail"]
+
+    run(scenario())
+
+
+def test_keys_are_scoped_per_authorization_header():
+    async def scenario():
+        stub = StubApp()
+        app = IdempotencyMiddleware(stub)
+
+        alice = await call(app, authorization=b"Bearer alice")
+        bob = await call(app, authorization=b"Bearer bob")
+
+        assert stub.calls == 2
+        assert alice[2]["call"] == 1 and bob[2]["call"] == 2
+        assert b"idempotent-replayed" not in bob[1]
+
+    run(scenario())
+
+
+def test_requests_without_authorization_or_to_auth_are_not_stored(fake_database):
+    async def scenario():
+        stub = StubApp()
+        app = IdempotencyMiddleware(stub)
+
+        await call(app, path="/api/auth/login")
+        await call(app, path="/api/auth/login")
+        await call(app, authorization=b"")
+
+        assert stub.calls == 3
+        assert fake_database.idempotency_keys.documents == {}
+
+    run(scenario())
+
+
+@pytest.mark.parametrize("status", [409, 429, 500, 503])
+def test_non_success_responses_are_not_stored(fake_database, status):
+    async def scenario():
+        stub = StubApp(status=status)
+        app = IdempotencyMiddleware(stub)
+
+        first = await call(app)
+        stub.status = 201
+        second = await call(app)
+
+        assert first[0] == status
+        assert second[0] == 201
+        assert stub.calls == 2
+        assert b"idempotent-replayed" not in second[1]
+
+    run(scenario())
+
+
+def test_live_lease_held_by_another_worker_returns_409(fake_database):
+    async def scenario():
+        stub = StubApp()
+        app = IdempotencyMiddleware(stub)
+        await call(app)
+        (cache_key, document), = fake_database.idempotency_keys.documents.items()
+        # Pretend another worker has started and not yet finished the same key
+        fake_database.idempotency_keys.documents[cache_key] = {
+            "_id": cache_key, "fingerprint": document["fingerprint"],
+            "expires_at": datetime.utcnow() + timedelta(seconds=60),
+        }
+        idempotency.response_cache = ResponseCache(100, 3600)
+
+        status, _, _ = await call(app)
+
+        assert status == 409
+        assert stub.calls == 1
+
+    run(scenario())
+
+
+def test_expired_lease_is_taken_over(fake_database):
+    async def scenario():
+        stub = StubApp()
+        app = IdempotencyMiddleware(stub)
+        await call(app)
+        (cache_key, document), = fake_database.idempotency_keys.documents.items()
+        # The worker holding the key died mid-request and its lease has lapsed
+        fake_database.idempotency_keys.documents[cache_key] = {
+            "_id": cache_key, "fingerprint": document["fingerprint"],
+            "expires_at": datetime.utcnow() - timedelta(seconds=1),
+        }
+        idempotency.response_cache = ResponseCache(100, 3600)
+
+        status, headers, _ = await call(app)
+
+        assert status == 201
+        assert stub.calls == 2
+        assert b"idempotent-replayed" not in headers
+        assert fake_database.idempotency_keys.documents[cache_key]["status_code"] == 201
+
+    run(scenario())
+
+
+def test_response_cache_honours_the_stored_expiry():
+    cache = ResponseCache(10, 3600)
+
+    cache.set("fresh", {"status": 201})
+    cache.set("expiring", {"status": 201}, datetime.utcnow() + timedelta(seconds=30))
+    cache.set("expired", {"status": 201}, datetime.utcnow() - timedelta(seconds=1))
+
+    assert cache.get("fresh") is not None
+    assert cache.get("expired") is None
+    expires_at, _ = cache._entries["expiring"]
+    assert expires_at - idempotency.time.monotonic() <= 30
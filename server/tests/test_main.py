@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+from pymongo.errors import AutoReconnect, OperationFailure
+
+import main
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(main.settings, "startup_retry_seconds", 0)
+
+    async def ping():
+        pass
+
+    monkeypatch.setattr(main, "ping_mongo", ping)
+
+
+def index_builder(*outcomes):
+    """ensure_idempotency_indexes stand-in raising each outcome in turn, then succeeding"""
+    calls = []
+
+    async def ensure():
+        calls.append(None)
+        if len(calls) <= len(outcomes):
+            raise outcomes[len(calls) - 1]
+
+    return ensure, calls
+
+
+def test_warm_up_retries_transient_index_errors(monkeypatch, fast_retries):
+    ensure, calls = index_builder(AutoReconnect("connection reset"), AutoReconnect("connection reset"))
+    monkeypatch.setattr(main, "ensure_idempotency_indexes", ensure)
+    main.app.state.ready = False
+
+    asyncio.run(main.warm_up(main.app))
+
+    assert len(calls) == 3
+    assert main.app.state.ready
+
+
+def test_warm_up_continues_after_rejected_index(monkeypatch, fast_retries):
+    ensure, calls = index_builder(OperationFailure("IndexOptionsConflict", code=85))
+    monkeypatch.setattr(main, "ensure_idempotency_indexes", ensure)
+    main.app.state.ready = False
+
+    asyncio.run(main.warm_up(main.app))
+
+    assert len(calls) == 1
+    assert main.app.state.ready
@@ -0,0 +1,182 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from pubsub import SLOW_CONSUMER, EventBroker, LocalEventSource
+from routers import events
+from routers.events import format_sse
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_events_are_routed_to_their_user_only():
+    async def scenario():
+        broker = EventBroker(LocalEventSource(), queue_size=10)
+        await broker.start()
+        alice = broker.subscribe("alice")
+        bob = broker.subscribe("bob")
+
+        await broker.publish("alice", "task", "created", "t1", {"title": "Write"})
+
+        event = await asyncio.wait_for(alice.get(), 1)
+        assert event == {"user": "alice", "type": "task.created", "id": "t1", "data": {"title": "Write"}}
+        assert bob.queue.empty()
+
+    run(scenario())
+
+
+def test_every_connection_of_a_user_receives_the_event():
+    async def scenario():
+        broker = EventBroker(LocalEventSource(), queue_size=10)
+        await broker.start()
+        laptop = broker.subscribe("alice")
+        phone = broker.subscribe("alice")
+
+        await broker.publish("alice", "note", "deleted", "n1")
+
+        assert (await laptop.get())["type"] == "note.deleted"
+        assert (await phone.get())["type"] == "note.deleted"
+
+    run(scenario())
+
+
+def test_unsubscribed_connection_stops_receiving():
+    async def scenario():
+        broker = EventBroker(LocalEventSource(), queue_size=10)
+        await broker.start()
+        subscription = broker.subscribe("alice")
+        broker.unsubscribe(subscription)
+
+        await broker.publish("alice", "goal", "updated", "g1", {})
+
+        assert subscription.queue.empty()
+        assert "alice" not in broker._subscribers
+
+    run(scenario())
+
+
+def test_slow_consumer_is_dropped_when_its_queue_is_full():
+    async def scenario():
+        broker = EventBroker(LocalEventSource(), queue_size=2)
+        await broker.start()
+        slow = broker.subscribe("alice")
+
+        for i in range(3):
+            await broker.publish("alice", "task", "updated", f"t{i}", {})
+
+        # The backlog is discarded and only the disconnect marker is left
+        assert slow.dropped
+        assert await slow.get() is SLOW_CONSUMER
+        assert slow.queue.empty()
+
+        await broker.publish("alice", "task", "updated", "t3", {})
+        assert slow.queue.empty()
+
+    run(scenario())
+
+
+def test_slow_consumer_does_not_affect_other_connections():
+    async def scenario():
+        broker = EventBroker(LocalEventSource(), queue_size=1)
+        await broker.start()
+        slow = broker.subscribe("alice")
+        fast = broker.subscribe("alice")
+
+        await broker.publish("alice", "task", "created", "t1", {})
+        await fast.get()
+        await broker.publish("alice", "task", "created", "t2", {})
+
+        assert slow.dropped
+        assert not fast.dropped
+        assert (await fast.get())["id"] == "t2"
+
+    run(scenario())
+
+
+def test_sse_framing():
+    event = {"user": "alice", "type": "task.created", "id": "t1", "data": {"title": "Write"}}
+
+    message = format_sse(event)
+
+    assert message.endswith("\n\n")
+    lines = message.rstrip("\n").split("\n")
+    assert lines[0] == "event: task.created"
+    assert lines[1].startswith("data: ")
+    # The user id is routing information, not part of the payload
+    assert json.loads(lines[1][len("data: "):]) == {"type": "task.created", "id": "t1", "data": {"title": "Write"}}
+
+
+class FakeWebSocket:
+    """Just enough of starlette's WebSocket for websocket_events"""
+
+    def __init__(self):
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.sent = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=1000, reason=None):
+        self.closed_with = code
+
+    def disconnect(self):
+        self.incoming.put_nowait({"type": "websocket.disconnect", "code": 1001})
+
+
+def serve_websocket(monkeypatch, broker, websocket):
+    async def user_from_token(token, scope=None):
+        return SimpleNamespace(id="alice")
+
+    monkeypatch.setattr(events, "broker", broker)
+    monkeypatch.setattr(events, "get_user_from_token", user_from_token)
+    return asyncio.create_task(events.websocket_events(websocket, "stream-token"))
+
+
+def test_websocket_unsubscribes_as_soon_as_the_client_disconnects(monkeypatch):
+    async def scenario():
+        broker = EventBroker(LocalEventSource(), queue_size=10)
+        await broker.start()
+        websocket = FakeWebSocket()
+        # No events and no heartbeat due: only the receive side can notice the close
+        monkeypatch.setattr(events.settings, "event_heartbeat_seconds", 3600)
+        endpoint = serve_websocket(monkeypatch, broker, websocket)
+        await asyncio.sleep(0)
+        assert "alice" in broker._subscribers
+
+        websocket.disconnect()
+        await asyncio.wait_for(endpoint, timeout=1)
+
+        assert "alice" not in broker._subscribers
+        assert websocket.sent == []
+
+    run(scenario())
+
+
+def test_websocket_delivers_events_and_ignores_client_messages(monkeypatch):
+    async def scenario():
+        broker = EventBroker(LocalEventSource(), queue_size=10)
+        await broker.start()
+        websocket = FakeWebSocket()
+        monkeypatch.setattr(events.settings, "event_heartbeat_seconds", 3600)
+        endpoint = serve_websocket(monkeypatch, broker, websocket)
+        await asyncio.sleep(0)
+
+        websocket.incoming.put_nowait({"type": "websocket.receive", "text": "hello"})
+        await broker.publish("alice", "goal", "updated", "g1", {"title": "Run"})
+        await asyncio.sleep(0.01)
+        websocket.disconnect()
+        await asyncio.wait_for(endpoint, timeout=1)
+
+        assert websocket.sent == [{"type": "goal.updated", "id": "g1", "data": {"title": "Run"}}]
+        assert "alice" not in broker._subscribers
+
+    run(scenario())
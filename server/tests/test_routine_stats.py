@@ -0,0 +1,99 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+import routine_stats
+from routine_stats import apply_toggle, compute_stats, effective_stats, is_day, parse_day, roll_forward
+
+TODAY = date(2025, 10, 15)
+
+
+@pytest.fixture(autouse=True)
+def fixed_today(monkeypatch):
+    monkeypatch.setattr(routine_stats, "today", lambda: TODAY)
+
+
+def day(offset: int) -> str:
+    return (TODAY + timedelta(days=offset)).isoformat()
+
+
+def test_parse_day_only_accepts_canonical_dates():
+    assert parse_day("2025-10-05") == date(2025, 10, 5)
+    for value in ("2025-1-5", "20251005", "2025-W41-1", "junk"):
+        with pytest.raises(ValueError):
+            parse_day(value)
+        assert not is_day(value)
+
+
+def test_compute_stats_streaks_and_windows():
+    completions = {day(-10): True, day(-9): True, day(-8): True, day(-2): True, day(-1): True, day(0): True, day(-3): False}
+
+    stats = compute_stats(completions)
+
+    assert stats["current_streak"] == 3
+    assert stats["longest_streak"] == 3
+    assert stats["streak_end"] == day(0)
+    assert stats["total_completions"] == 6
+    assert stats["completed_7d"] == 3
+    assert stats["completed_30d"] == 6
+    assert stats["as_of"] == TODAY.isoformat()
+
+
+def test_compute_stats_ignores_non_canonical_keys():
+    stats = compute_stats({"2025-1-5": True, "20251014": True, day(0): True})
+
+    assert stats["total_completions"] == 1
+    assert stats["completed_7d"] == 1
+
+
+def test_effective_stats_lapses_streak_not_extended_since_yesterday():
+    assert effective_stats(compute_stats({day(-1): True}))["current_streak"] == 1
+    assert effective_stats(compute_stats({day(-2): True}))["current_streak"] == 0
+    assert effective_stats(compute_stats({}))["current_streak"] == 0
+
+
+def test_effective_stats_hides_the_write_revision():
+    stats = dict(compute_stats({day(0): True}), revision=3)
+
+    assert "revision" not in effective_stats(stats)
+    assert stats["revision"] == 3
+
+
+def test_roll_forward_slides_windows():
+    completions = {day(-7): True, day(-1): True}
+    stats = compute_stats(completions, as_of=TODAY - timedelta(days=1))
+    assert stats["completed_7d"] == 2
+
+    rolled = roll_forward(stats, completions)
+
+    assert rolled["as_of"] == TODAY.isoformat()
+    assert rolled["completed_7d"] == 1
+    assert roll_forward(rolled, completions) is rolled
+
+
+def test_apply_toggle_matches_full_recompute():
+    rng = random.Random(7)
+    for _ in range(200):
+        completions = {}
+        stats = None
+        for _ in range(40):
+            toggled = TODAY + timedelta(days=rng.randint(-40, 2))
+            key = toggled.isoformat()
+            completions[key] = not completions.get(key, False)
+            stats = apply_toggle(stats, completions, toggled)
+
+            expected = compute_stats(completions)
+            for field in ("longest_streak", "total_completions", "completed_7d", "completed_30d"):
+                assert stats[field] == expected[field]
+            assert effective_stats(stats)["current_streak"] == effective_stats(expected)["current_streak"]
+
+
+def test_apply_toggle_with_stale_windows():
+    completions = {day(-8): True, day(-2): True}
+    stats = compute_stats(completions, as_of=TODAY - timedelta(days=2))
+
+    completions[day(0)] = True
+    stats = apply_toggle(stats, completions, TODAY)
+
+    assert stats == compute_stats(completions)